@@ -1,63 +1,197 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from textblob import TextBlob
-import matplotlib.pyplot as plt
-import seaborn as sns
-import folium
-from folium.plugins import MarkerCluster
-import gdown
 import os
+import uuid
+from pyarrow import feather
+
+# gdown, folium and matplotlib are imported where they are used,
+# so a rerun that never downloads, maps or plots doesn't pay for them
 
 st.set_page_config(page_title="Franchisee Tracker", page_icon=":🔍:")
 
 # Initialize session state variables if they don't exist
-if 'city' not in st.session_state:
-    st.session_state.city = None
-if 'category' not in st.session_state:
-    st.session_state.category = ""
-if 'business_name' not in st.session_state:
-    st.session_state.business_name = ""
+# (the search inputs are kept by their widget keys: city_select, category_input, business_name_input)
 if 'submitted' not in st.session_state:
     st.session_state.submitted = False
 
 # Use the correct URL format for direct download and add fuzzy option
 url = 'https://drive.google.com/file/d/16L_xOmMCQA3rcFGNI0B7E2OIRPXCzlJt/view?usp=sharing'
 
-# Only download if file doesn't exist or is too small
+# One row per review; the 'sentiment' column holds a polarity score (-1.0 to 1.0) computed offline,
+# so the app never runs sentiment analysis itself
 file_path = 'florida_with_sentiment.csv'
-if not os.path.exists(file_path) or os.path.getsize(file_path) < 1000000:  # Less than 1MB
+
+# Uncompressed Feather (Arrow IPC) copy of the CSV, so later starts memory-map binary columns instead of re-tokenizing text
+feather_path = 'florida_with_sentiment.feather'
+
+# Only the columns the app actually uses are parsed
+columns = ['business_id', 'name', 'address', 'city', 'categories', 'latitude', 'longitude', 'sentiment']
+
+# Repeated strings are stored as categories, so comparisons and groupbys work on integer codes;
+# coordinates and sentiment scores fit in float32, which halves their memory
+dtypes = {'business_id': 'category', 'name': 'category', 'address': 'category', 'city': 'category',
+          'latitude': 'float32', 'longitude': 'float32', 'sentiment': 'float32'}
+
+# Map each city to its lowercased categories (e.g. "restaurants") and the positions of the rows that list them
+def index_categories(df):
+    tokens = df['categories'].reset_index(drop=True).str.lower().str.split(r',\s*').explode().dropna()
+    row_positions = tokens.index.to_numpy()
+    pairs = pd.DataFrame({'city': df['city'].to_numpy()[row_positions], 'token': tokens.to_numpy()})
+    index = {}
+    for (city, token), positions in pairs.groupby(['city', 'token']).indices.items():
+        index.setdefault(city, {})[token] = row_positions[positions]
+    return index
+
+# Count positive, negative and neutral reviews per location for the whole dataset in one vectorized pass
+# (dropna=False keeps locations without an address, so they still get a map marker)
+def summarize_locations(df):
+    sentiment = df['sentiment']
+    summary = df.assign(
+        positive=(sentiment > 0).astype('int8'),
+        negative=(sentiment < 0).astype('int8'),
+        neutral=(sentiment == 0).astype('int8')
+    ).groupby(['business_id', 'name', 'address'], observed=True, dropna=False).agg(
+        positive_reviews=('positive', 'sum'),
+        negative_reviews=('negative', 'sum'),
+        neutral_reviews=('neutral', 'sum'),
+        mean_sentiment=('sentiment', 'mean'),
+        sentiment_count=('sentiment', 'count'),
+        latitude=('latitude', 'first'),
+        longitude=('longitude', 'first')
+    ).reset_index()
+    # Map marker color from the average sentiment (positive: green, negative: red, neutral: gray)
+    mean_sentiment = summary['mean_sentiment'].to_numpy()
+    summary['color'] = pd.Categorical(np.select([mean_sentiment > 0, mean_sentiment < 0], ['green', 'red'], default='gray'))
+    return summary
+
+# Parse the CSV once into Feather; write to a uniquely named temporary file first,
+# so other sessions never read (or overwrite) a partial file
+def convert_to_feather(csv_path, path):
+    df = pd.read_csv(csv_path, usecols=columns, dtype=dtypes)
+    # Store the rows grouped by city (stable, so reviews keep their order), which keeps each city's rows contiguous
+    df = df.sort_values('city', kind='stable').reset_index(drop=True)
+    # A unique name created by to_feather itself, so the file gets the usual umask permissions (mkstemp's are 0600)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        df.to_feather(tmp_path, compression='uncompressed')
+        os.replace(tmp_path, path)
+    finally:
+        # Don't leave a temporary file behind if the write failed
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+# Read the Feather file once per process and share the DataFrame across reruns and sessions
+# (cache_resource hands out the same objects without copying, so they must never be mutated);
+# mtime is only part of the cache key, so a rewritten file is loaded again (and only the latest copy is kept)
+@st.cache_resource(show_spinner="Loading Florida data…", max_entries=1)
+def load_df(path, mtime):
+    # split_blocks/self_destruct let numeric columns stay zero-copy views of the memory-mapped file
+    df = feather.read_table(path, columns=columns, memory_map=True).to_pandas(split_blocks=True, self_destruct=True)
+    category_rows = index_categories(df)
+    # The raw categories strings are only needed to build the index, so don't keep them in memory
+    df = df.drop(columns='categories')
+    return df, category_rows, summarize_locations(df)
+
+# Only download if there is no Feather copy yet and the CSV doesn't exist or is too small
+if not os.path.exists(feather_path) and (not os.path.exists(file_path) or os.path.getsize(file_path) < 1000000):  # Less than 1MB
+    import gdown
+
     # Use fuzzy=True to handle Google Drive sharing links
     gdown.download(url, file_path, quiet=False, fuzzy=True)
 
-# Check if the file exists and has content before loading
-if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
-    # Now read the CSV
+# Convert right after a download (or whenever a newer CSV is present), so the CSV is parsed only once;
+# a CSV under 1MB is treated as an incomplete download and never converted, so it is downloaded again
+if os.path.exists(file_path) and os.path.getsize(file_path) >= 1000000:
+    if not os.path.exists(feather_path) or os.path.getmtime(feather_path) < os.path.getmtime(file_path):
+        try:
+            convert_to_feather(file_path, feather_path)
+        except Exception as e:
+            print(f"Error converting CSV: {e}")
+
+# Check if the file exists before loading
+if os.path.exists(feather_path):
     try:
-        df = pd.read_csv(file_path)
-        print(f"Successfully loaded CSV with {len(df)} rows and {len(df.columns)} columns")
+        # Now read the Feather copy; its mtime also keys the cached search results,
+        # which hold row positions into this particular version of the data
+        data_version = os.path.getmtime(feather_path)
+        df, category_rows, location_summary = load_df(feather_path, data_version)
+        print(f"Successfully loaded data with {len(df)} rows and {len(df.columns)} columns")
     except Exception as e:
-        print(f"Error reading CSV: {e}")
+        print(f"Error reading data: {e}")
         # You might want to add a fallback here
 else:
     print(f"File download failed or file is empty")
 
                     
-# Filter data based on city and category
-def filter_data(city, category, business_name=None):
-    filtered = df[(df['city'] == city) & (df['categories'].str.contains(category, case=False, na=False))]
+# Filter data based on city and category (cached per search so reruns skip the category scan);
+# returns row positions into df rather than a copy of the rows, so data_version is part of the cache key
+@st.cache_data(show_spinner=False)
+def filter_data(data_version, city, category, business_name=None):
+    # Look each search term up in the city's small category vocabulary instead of scanning every row;
+    # comma-separated terms (e.g. "food, cafes") must all match one of a business's categories
+    city_categories = category_rows.get(city, {})
+    # Blank terms (e.g. "   " or a stray comma) would match every category, so they are ignored
+    terms = [term for term in (term.strip() for term in category.lower().split(',')) if term]
+    if not terms:
+        return np.empty(0, dtype=np.intp)
+    rows = None
+    for search in terms:
+        matches = [positions for token, positions in city_categories.items() if search in token]
+        term_rows = np.unique(np.concatenate(matches)) if matches else np.empty(0, dtype=np.intp)
+        rows = term_rows if rows is None else np.intersect1d(rows, term_rows, assume_unique=True)
     if business_name:
-        filtered = filtered[filtered['name'].str.contains(business_name, case=False, na=False)]
-    return filtered
-
-# Function to perform sentiment analysis per review
-def sentiment_analysis(reviews):
-    sentiments = []
-    for review in reviews:
-        blob = TextBlob(review)
-        sentiment = blob.sentiment.polarity
-        sentiments.append(sentiment)
-    return sentiments
+        rows = rows[df['name'].iloc[rows].str.contains(business_name, case=False, na=False, regex=False).to_numpy()]
+    # Order the rows by name (stable, so reviews keep their order), so each business is one contiguous run
+    return rows[np.argsort(df['name'].cat.codes.to_numpy()[rows], kind='stable')]
+
+# Row positions of one business within a filter_data result, found by binary search over the name codes
+def select_business(rows, business):
+    codes = df['name'].cat.codes.to_numpy()[rows]
+    code = df['name'].cat.categories.get_loc(business)
+    start, end = np.searchsorted(codes, [code, code + 1])
+    return rows[start:end]
+
+# Count how many locations each business in the search results has (cached per search, like filter_data)
+@st.cache_data(show_spinner=False)
+def count_locations(data_version, city, category, business_name=None):
+    rows = filter_data(data_version, city, category, business_name)
+    # Deduplicate on just the two categorical columns, so only their integer codes are hashed
+    business_counts = df[['name', 'business_id']].iloc[rows].drop_duplicates().groupby('name', observed=True).size().reset_index(name='franchisee_count')
+    return business_counts.sort_values('franchisee_count', ascending=False)
+
+# Select the precomputed per-location summary rows of one business in the search results (cached per search and business)
+@st.cache_data(show_spinner=False)
+def summarize_business(data_version, city, category, business_name, selected_business):
+    rows = select_business(filter_data(data_version, city, category, business_name), selected_business)
+    business_ids = df['business_id'].iloc[rows].unique()
+    return location_summary[location_summary['business_id'].isin(business_ids)].reset_index(drop=True)
+
+# Build the map for a business and cache the rendered HTML, so reruns with the same locations skip Folium entirely
+@st.cache_data(show_spinner=False)
+def render_business_map_html(business_name, center, markers):
+    import folium
+    from folium.plugins import MarkerCluster
+
+    business_map = folium.Map(location=list(center), zoom_start=9)
+    # Cluster markers only for large franchises; below 50 locations they go straight onto the map
+    marker_layer = business_map if len(markers) < 50 else MarkerCluster().add_to(business_map)
+
+    # Add a marker for each location of the business
+    for lat, lon, sentiment, address, color in markers:
+        # Add marker with pop-up
+        folium.CircleMarker(
+            location=[lat, lon],
+            radius=8,
+            color=color,
+            fill=True,
+            fill_color=color,
+            fill_opacity=0.7,
+            popup=f"{business_name} ({address}): Sentiment: {sentiment:.2f}"
+        ).add_to(marker_layer)
+
+    # Render the map as a standalone HTML page
+    return business_map.get_root().render()
 
 # Callback function when submit button is clicked
 def on_submit():
@@ -92,37 +226,35 @@ Start by selecting a city and business category below.
 st.subheader("Step 1: Select Location and Business Type")
 st.write("Choose a city in Florida and specify what type of business you're interested in.")
 
-city = st.selectbox("Select a city", df['city'].unique(), key="city_select")
-st.session_state.city = city
+# The search inputs live in a form, so typing or picking a city doesn't rerun the analysis until Submit is clicked
+with st.form("search"):
+    st.selectbox("Select a city", df['city'].cat.categories, key="city_select")
 
-# Category input (e.g., 'restaurant')
-st.write("Enter a business category (e.g., restaurant, coffee, healthcare, etc.)")
-category = st.text_input("Search for a category", value=st.session_state.category, key="category_input")
-st.session_state.category = category
+    # Category input (e.g., 'restaurant')
+    st.write("Enter a business category (e.g., restaurant, coffee, healthcare, etc.)")
+    st.text_input("Search for a category", key="category_input")
 
-# Optional business name input
-st.write("Optionally, you can narrow your search to a specific business name.")
-business_name = st.text_input("Search for a specific business name (optional)", value=st.session_state.business_name, key="business_name_input")
-st.session_state.business_name = business_name
+    # Optional business name input
+    st.write("Optionally, you can narrow your search to a specific business name.")
+    st.text_input("Search for a specific business name (optional)", key="business_name_input")
 
-# Button to submit the search
-st.write("Once you've made your selections, click Submit to analyze the data.")
-submit_button = st.button("Submit", on_click=on_submit)
+    # Button to submit the search
+    st.write("Once you've made your selections, click Submit to analyze the data.")
+    submit_button = st.form_submit_button("Submit", on_click=on_submit)
 
 # Only proceed with analysis if submitted
 if st.session_state.submitted:
-    if st.session_state.city and st.session_state.category:
+    if st.session_state.city_select and st.session_state.category_input:
         # Filter data based on city, category, and optional business name
-        filtered_data = filter_data(st.session_state.city, st.session_state.category, st.session_state.business_name)
+        filtered_rows = filter_data(data_version, st.session_state.city_select, st.session_state.category_input, st.session_state.business_name_input)
 
-        if len(filtered_data) > 0:
+        if len(filtered_rows) > 0:
             # Display filtered businesses
-            st.success(f"Found {len(filtered_data)} businesses in {st.session_state.city} under the category '{st.session_state.category}'.")
+            st.success(f"Found {len(filtered_rows)} businesses in {st.session_state.city_select} under the category '{st.session_state.category_input}'.")
             st.write("Now analyzing customer sentiment for these businesses...")
 
             # Count how many locations each business has by unique business_id
-            business_counts = filtered_data.drop_duplicates('business_id').groupby('name').size().reset_index(name='franchisee_count')
-            business_counts = business_counts.sort_values('franchisee_count', ascending=False)
+            business_counts = count_locations(data_version, st.session_state.city_select, st.session_state.category_input, st.session_state.business_name_input)
             
             # Display the list of businesses and how many franchisees each has
             st.subheader("Step 2: Select a Business for Detailed Analysis")
@@ -155,7 +287,7 @@ if st.session_state.submitted:
                 st.session_state.selected_business = selected_business
                 
                 # Filter data for selected business
-                selected_business_data = filtered_data[filtered_data['name'] == selected_business]
+                selected_business_data = df.iloc[select_business(filtered_rows, selected_business)]
                 
                 if not selected_business_data.empty:
                     st.subheader(f"Step 3: Detailed Analysis for {selected_business}")
@@ -164,14 +296,9 @@ if st.session_state.submitted:
                     This will help identify which locations are performing better than others.
                     """)
 
-                    # In the sentiment analysis section, modify to group by business_id and include address
-                    sentiment_summary = selected_business_data.groupby(['business_id', 'name', 'address'])['sentiment'].agg(
-                        positive_reviews=lambda x: (x > 0).sum(),
-                        negative_reviews=lambda x: (x < 0).sum(),
-                        neutral_reviews=lambda x: (x == 0).sum(),
-                        mean_sentiment='mean',
-                        sentiment_count='count'
-                    ).reset_index()
+                    # Look up the precomputed per-location summary (grouped by business_id and including address)
+                    sentiment_summary = summarize_business(data_version, st.session_state.city_select, st.session_state.category_input,
+                                                           st.session_state.business_name_input, selected_business)
                     
                     # Display sentiment summary table for selected business
                     st.write("""
@@ -184,11 +311,13 @@ if st.session_state.submitted:
                     st.dataframe(sentiment_summary[['name', 'address', 'positive_reviews', 'negative_reviews', 
                                                   'neutral_reviews', 'mean_sentiment', 'sentiment_count']])
                     
-                    # Get unique business IDs for this business
-                    unique_business_ids = selected_business_data['business_id'].unique().tolist()
+                    # Get unique business IDs (and their addresses) for this business, one row per location
+                    location_pairs = selected_business_data[['business_id', 'address']].drop_duplicates('business_id')
+                    unique_business_ids = location_pairs['business_id'].tolist()
                     
-                    # Create a mapping from business_id to address for display purposes
-                    id_to_address = dict(zip(selected_business_data['business_id'], selected_business_data['address']))
+                    # Create mappings between business_id and address for display purposes
+                    id_to_address = dict(zip(location_pairs['business_id'].to_numpy(), location_pairs['address'].to_numpy()))
+                    address_to_id = dict(zip(location_pairs['address'].to_numpy(), location_pairs['business_id'].to_numpy()))
                     
                     # Add the addresses corresponding to each business_id (WITHOUT "All Locations" option)
                     location_addresses = [id_to_address.get(bid, "Unknown Address") for bid in unique_business_ids]
@@ -203,49 +332,28 @@ if st.session_state.submitted:
                     # Create a map for just the selected business
                     st.write("""
                     #### Location Map
-                    This map shows all locations for your selected business. Color indicates the sentiment at each location.
+                    This map shows all locations for your selected business. Color indicates the average sentiment at each location.
                     - **Green markers** indicate positive sentiment
                     - **Red markers** indicate negative sentiment
                     - **Gray markers** indicate neutral sentiment
             
-                    Click on any marker to see the business name, postal code, and sentiment score.
+                    Click on any marker to see the business name, address, and average sentiment score.
                     """)
                     
                     # Initialize the map centered on the first location of the selected business
                     selected_lat = selected_business_data['latitude'].mean()
                     selected_lon = selected_business_data['longitude'].mean()
                     
-                    business_map = folium.Map(location=[selected_lat, selected_lon], zoom_start=9)
-                    business_marker_cluster = MarkerCluster().add_to(business_map)
-                    
-                    # Add markers for each location of the selected business
-                    for _, row in selected_business_data.iterrows():
-                        lat = row['latitude']
-                        lon = row['longitude']
-                        sentiment = row['sentiment']
-                        address = row['address']
-                        
-                        # Color based on sentiment (positive: green, negative: red, neutral: gray)
-                        if sentiment > 0:
-                            color = 'green'
-                        elif sentiment < 0:
-                            color = 'red'
-                        else:
-                            color = 'gray'
-                        
-                        # Add marker with pop-up
-                        folium.CircleMarker(
-                            location=[lat, lon],
-                            radius=8,
-                            color=color,
-                            fill=True,
-                            fill_color=color,
-                            fill_opacity=0.7,
-                            popup=f"{selected_business} ({address}): Sentiment: {sentiment:.2f}"
-                        ).add_to(business_marker_cluster)
-                    
+                    # One marker per location (not per review), taken from the precomputed location summary and colors;
+                    # plain tuples keep the map cache key cheap to hash
+                    markers = tuple(zip(sentiment_summary['latitude'].tolist(),
+                                        sentiment_summary['longitude'].tolist(),
+                                        sentiment_summary['mean_sentiment'].tolist(),
+                                        sentiment_summary['address'].tolist(),
+                                        sentiment_summary['color'].tolist()))
+
                     # Render the business-specific map in Streamlit
-                    st.components.v1.html(business_map._repr_html_(), height=600)
+                    st.components.v1.html(render_business_map_html(selected_business, (float(selected_lat), float(selected_lon)), markers), height=600)
                     
                     # Dropdown to select specific location by address (WITHOUT "All Locations" option)
                     st.subheader("Step 4: Location-Specific Analysis")
@@ -269,29 +377,37 @@ if st.session_state.submitted:
                     # When a specific address is selected, show only that location
                     st.write(f"Showing detailed sentiment analysis for location: {selected_address}")
                     # Find the business_id corresponding to the selected address
-                    address_to_id = {v: k for k, v in id_to_address.items()}
                     selected_bid = address_to_id.get(selected_address)
                     
                     if selected_bid:
                         location_data = selected_business_data[selected_business_data['business_id'] == selected_bid]
                         if len(location_data) > 0:
-                            # Add location-specific stats
-                            positive_count = (location_data['sentiment'] > 0).sum()
-                            negative_count = (location_data['sentiment'] < 0).sum()
-                            neutral_count = (location_data['sentiment'] == 0).sum()
-                            avg_sentiment = location_data['sentiment'].mean()
+                            # Add location-specific stats, computed on the raw NumPy array
+                            location_sentiments = location_data['sentiment'].to_numpy()
+                            review_count = location_sentiments.size
+                            scores = location_sentiments[~np.isnan(location_sentiments)]
+                            # Shift the signs (-1, 0, 1) to (0, 1, 2) so one bincount pass counts all three (missing scores excluded)
+                            signs = np.sign(scores).astype(np.intp) + 1
+                            negative_count, neutral_count, positive_count = np.bincount(signs, minlength=3)
+                            avg_sentiment = scores.mean() if scores.size else np.nan
                             
                             st.write(f"""
                             **Location Statistics:**
-                            - Positive reviews: {positive_count} ({positive_count/len(location_data)*100:.1f}%)
-                            - Negative reviews: {negative_count} ({negative_count/len(location_data)*100:.1f}%)
-                            - Neutral reviews: {neutral_count} ({neutral_count/len(location_data)*100:.1f}%)
+                            - Positive reviews: {positive_count} ({positive_count/review_count*100:.1f}%)
+                            - Negative reviews: {negative_count} ({negative_count/review_count*100:.1f}%)
+                            - Neutral reviews: {neutral_count} ({neutral_count/review_count*100:.1f}%)
                             - Average sentiment: {avg_sentiment:.2f}
-                            - Total reviews: {len(location_data)}
+                            - Total reviews: {review_count}
                             """)
                             
-                            fig, ax = plt.subplots()
-                            sns.histplot(location_data['sentiment'], bins=20, kde=True, ax=ax)
+                            from matplotlib.figure import Figure
+
+                            # A standalone Figure is freed after rendering instead of piling up in pyplot's global registry
+                            fig = Figure()
+                            ax = fig.subplots()
+                            # Bin the scores with NumPy and draw them as bars
+                            counts, edges = np.histogram(scores, bins=20)
+                            ax.bar(edges[:-1], counts, width=np.diff(edges), align='edge', edgecolor='white')
                             ax.set_title(f"Sentiment Distribution for {selected_business} ({selected_address})")
                             ax.set_xlabel("Sentiment Score")
                             ax.set_ylabel("Review Count")